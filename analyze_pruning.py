@@ -6,60 +6,235 @@ Extracts opacity distribution and stroke statistics
 """
 
 import os
+import re
+import csv
+import mmap
+import array
 import sys
 import argparse
+import hashlib
+import zipfile
+import functools
+import itertools
 import xml.etree.ElementTree as ET
 from pathlib import Path
-import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# SVG namespace; bare tags cover files written without an xmlns
+SVG_NS = '{http://www.w3.org/2000/svg}'
+STROKE_TAGS = (SVG_NS + 'path', SVG_NS + 'g', 'path', 'g')
+
+# Full float syntax: diffvg writes near-zero opacities in exponent form (e.g. 1e-05)
+_FLOAT_PATTERN = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+_STROKE_OPACITY_RE = re.compile(r'stroke-opacity\s*:\s*(' + _FLOAT_PATTERN + ')')
+
+# Byte patterns for scanning raw SVG without an XML parser
+_RAW_SVG_XMLNS_RE = re.compile(rb'xmlns\s*=\s*["\']http://www\.w3\.org/2000/svg["\']')
+_RAW_TAG_START_RE = re.compile(rb'<(?:path|g)')
+_RAW_PREFIXED_TAG_RE = re.compile(rb'<[\w.-]+:(?:path|g)[\s/>]')
+# Quote-aware, so a '>' inside an attribute value does not end the tag
+_RAW_TAG_RE = re.compile(rb'<(?:path|g)(?=[\s/>])((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>')
+_RAW_STYLE_RE = re.compile(rb'\sstyle\s*=\s*(["\'])(.*?)\1', re.S)
+_RAW_STYLE_STROKE_OPACITY_RE = re.compile(rb'stroke-opacity\s*:\s*(' + _FLOAT_PATTERN.encode() + rb')')
+_RAW_STROKE_OPACITY_RE = re.compile(rb'\sstroke-opacity\s*=\s*["\']([^"\']+)')
+_RAW_OPACITY_RE = re.compile(rb'\sopacity\s*=\s*["\']([^"\']+)')
+
+# Path substring -> short display name, checked in order
+SHORT_NAMES = (
+    ('baseline_128', "Baseline 128"),
+    ('baseline_256', "Baseline 256"),
+    ('pruned_128', "Pruned 128"),
+    ('pruned_256', "Pruned 256"),
+    ('aggressive', "Aggressive"),
+)
+
+# Opacity category edges: dead / ghost / low / visible
+OPACITY_BINS = np.array([-np.inf, 0.01, 0.1, 0.3, np.inf])
+
+# Parsed opacities are cached under $XDG_CACHE_HOME/diffsketcher_analyzer, keyed by (path, mtime, size).
+# Bump CACHE_VERSION whenever parse_svg changes what it extracts.
+CACHE_VERSION = 5
+
+
+def iter_stroke_elements(svg_path):
+    """Yield path and g elements, streaming with lxml when it is available"""
+    if etree is None:
+        # Tag-filtered iter skips non-matching nodes inside _elementtree
+        root = ET.parse(svg_path).getroot()
+        yield from itertools.chain.from_iterable(root.iter(tag) for tag in STROKE_TAGS)
+        return
+
+    for _, elem in etree.iterparse(str(svg_path), events=('end',), tag=STROKE_TAGS):
+        yield elem
+
+        # Drop processed elements to keep memory bounded
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
 
 
 def parse_svg(svg_path):
     """Parse SVG and extract stroke opacities"""
-    tree = ET.parse(svg_path)
-    root = tree.getroot()
-
-    # SVG namespace
-    ns = {'svg': 'http://www.w3.org/2000/svg'}
-
-    opacities = []
+    result = scan_svg_bytes(svg_path)
+    if result is None:
+        result = parse_svg_xml(svg_path)
+    return result
+
+
+def scan_svg_bytes(svg_path):
+    """
+    Extract stroke opacities by scanning the raw SVG bytes, without an XML parser.
+    Returns None when the file contains markup the scanner can't handle reliably
+    (no default SVG namespace, comments, CDATA, a DOCTYPE, namespace-prefixed path/g
+    elements or character/entity references in their attributes), so the caller falls
+    back to XML.
+    """
+    with open(svg_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if (_RAW_SVG_XMLNS_RE.search(mm) is None
+                    or mm.find(b'<!--') != -1 or mm.find(b'<![CDATA[') != -1
+                    or mm.find(b'<!DOCTYPE') != -1 or _RAW_PREFIXED_TAG_RE.search(mm)):
+                return None
+
+            opacities = array.array('d')
+            for tag in _RAW_TAG_RE.finditer(mm):
+                attrs = tag.group(1)
+                if b'&' in attrs:
+                    return None
+
+                # Same precedence as parse_svg_xml: style, stroke-opacity, opacity, 1.0
+                style = _RAW_STYLE_RE.search(attrs)
+                m = _RAW_STYLE_STROKE_OPACITY_RE.search(style.group(2)) if style else None
+                if m is None:
+                    m = _RAW_STROKE_OPACITY_RE.search(attrs)
+                if m is None:
+                    m = _RAW_OPACITY_RE.search(attrs)
+                opacities.append(float(m.group(1)) if m else 1.0)
+
+            # Every '<path' / '<g' occurrence must have been matched as a tag
+            if len(opacities) != len(_RAW_TAG_START_RE.findall(mm)):
+                return None
+
+    return np.frombuffer(opacities, dtype=np.float64), len(opacities)
+
+
+def parse_svg_xml(svg_path):
+    """Parse SVG with an XML parser and extract stroke opacities"""
+    opacities = array.array('d')
     stroke_count = 0
 
     # Find all path and g elements
-    for elem in root.iter():
-        if elem.tag.endswith('path') or elem.tag.endswith('g'):
-            stroke_count += 1
+    for elem in iter_stroke_elements(svg_path):
+        stroke_count += 1
+
+        # Extract stroke opacity
+        style = elem.get('style', '')
+
+        # Parse style attribute
+        m = _STROKE_OPACITY_RE.search(style)
+        stroke_opacity = float(m.group(1)) if m else None
+
+        # Check direct attribute
+        if stroke_opacity is None:
+            stroke_opacity = elem.get('stroke-opacity')
+            if stroke_opacity:
+                stroke_opacity = float(stroke_opacity)
+
+        # Check opacity attribute
+        if stroke_opacity is None:
+            opacity = elem.get('opacity')
+            if opacity:
+                stroke_opacity = float(opacity)
 
-            # Extract stroke opacity
-            style = elem.get('style', '')
-            stroke_opacity = None
+        # Default to 1.0 if not found
+        if stroke_opacity is None:
+            stroke_opacity = 1.0
 
-            # Parse style attribute
-            if 'stroke-opacity' in style:
-                for part in style.split(';'):
-                    if 'stroke-opacity' in part:
-                        stroke_opacity = float(part.split(':')[1].strip())
-                        break
+        opacities.append(stroke_opacity)
 
-            # Check direct attribute
-            if stroke_opacity is None:
-                stroke_opacity = elem.get('stroke-opacity')
-                if stroke_opacity:
-                    stroke_opacity = float(stroke_opacity)
+    return np.frombuffer(opacities, dtype=np.float64), stroke_count
 
-            # Check opacity attribute
-            if stroke_opacity is None:
-                opacity = elem.get('opacity')
-                if opacity:
-                    stroke_opacity = float(opacity)
 
-            # Default to 1.0 if not found
-            if stroke_opacity is None:
-                stroke_opacity = 1.0
+def _cache_dir():
+    """Cache directory, or None when neither XDG_CACHE_HOME nor a home directory is available"""
+    cache_home = os.environ.get('XDG_CACHE_HOME')
+    if not cache_home:
+        try:
+            cache_home = Path.home() / '.cache'
+        except (RuntimeError, KeyError):
+            return None
+    return Path(cache_home) / 'diffsketcher_analyzer'
 
-            opacities.append(stroke_opacity)
 
-    return np.array(opacities), stroke_count
+def _cache_path(path_str):
+    cache_dir = _cache_dir()
+    if cache_dir is None:
+        return None
+    # path_str is already resolved by analyze_svg_file
+    digest = hashlib.sha1(path_str.encode('utf-8')).hexdigest()
+    return cache_dir / f"{digest}.npz"
+
+
+def load_cached_svg(path_str, mtime_ns, size):
+    """Return cached (opacities, count) if the SVG is unchanged since it was cached"""
+    cache_path = _cache_path(path_str)
+    if cache_path is None:
+        return None
+    try:
+        with np.load(cache_path) as data:
+            key = (int(data['version']), int(data['mtime_ns']), int(data['size']))
+            if key != (CACHE_VERSION, mtime_ns, size):
+                return None
+            return data['opacities'], int(data['count'])
+    except (OSError, EOFError, KeyError, ValueError, zipfile.BadZipFile):
+        return None
+
+
+def save_cached_svg(path_str, mtime_ns, size, opacities, count):
+    """Store parse results for path_str, silently skipping an unwritable cache"""
+    cache_path = _cache_path(path_str)
+    if cache_path is None:
+        return
+    tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, version=CACHE_VERSION, mtime_ns=mtime_ns, size=size,
+                     opacities=opacities, count=count)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+
+
+@functools.lru_cache(maxsize=64)
+def load_svg(path_str, mtime_ns, size, use_cache=True):
+    """
+    Return (opacities, count) for an SVG, from the in-process memo, the disk cache or a fresh parse.
+    mtime_ns and size are part of the memo key, so a rewritten file is parsed again.
+    """
+    parsed = load_cached_svg(path_str, mtime_ns, size) if use_cache else None
+    if parsed is None:
+        parsed = parse_svg(path_str)
+        if use_cache:
+            save_cached_svg(path_str, mtime_ns, size, *parsed)
+
+    # The memoized array is shared between callers
+    parsed[0].setflags(write=False)
+    return parsed
 
 
 def extract_short_name(svg_path):
@@ -69,24 +244,19 @@ def extract_short_name(svg_path):
     # Try to extract test name from path structure
     # e.g., ".../baseline_128paths/..." -> "Baseline 128"
     # e.g., ".../pruned_256paths/..." -> "Pruned 256"
-    if 'baseline_128' in path_str:
-        return "Baseline 128"
-    elif 'baseline_256' in path_str:
-        return "Baseline 256"
-    elif 'pruned_128' in path_str:
-        return "Pruned 128"
-    elif 'pruned_256' in path_str:
-        return "Pruned 256"
-    elif 'pruned_aggressive' in path_str or 'aggressive' in path_str:
-        return "Aggressive"
-    else:
-        # Fallback: use parent directory name
-        return Path(svg_path).parent.parent.name
+    for key, name in SHORT_NAMES:
+        if key in path_str:
+            return name
+
+    # Fallback: use parent directory name
+    return Path(svg_path).parent.parent.name
 
 
-def analyze_svg_file(svg_path, name=None):
+def analyze_svg_file(svg_path, name=None, use_cache=True):
     """Analyze a single SVG file"""
-    if not Path(svg_path).exists():
+    try:
+        st = Path(svg_path).stat()
+    except FileNotFoundError:
         print(f"⚠ File not found: {svg_path}")
         return None
 
@@ -94,13 +264,12 @@ def analyze_svg_file(svg_path, name=None):
     if name is None:
         name = extract_short_name(svg_path)
 
-    opacities, count = parse_svg(svg_path)
+    opacities, count = load_svg(str(Path(svg_path).resolve()), st.st_mtime_ns, st.st_size, use_cache)
+    if count == 0:
+        print(f"⚠ No path or g elements found in: {svg_path}")
 
-    # Calculate statistics
-    dead_strokes = np.sum(opacities < 0.01)
-    ghost_strokes = np.sum((opacities >= 0.01) & (opacities < 0.1))
-    low_strokes = np.sum((opacities >= 0.1) & (opacities < 0.3))
-    visible_strokes = np.sum(opacities >= 0.3)
+    # Calculate statistics in a single pass over the opacities
+    dead_strokes, ghost_strokes, low_strokes, visible_strokes = np.histogram(opacities, bins=OPACITY_BINS)[0]
 
     stats = {
         'name': name,
@@ -111,23 +280,28 @@ def analyze_svg_file(svg_path, name=None):
         'ghost': ghost_strokes,
         'low': low_strokes,
         'visible': visible_strokes,
-        'mean_opacity': np.mean(opacities),
-        'median_opacity': np.median(opacities),
-        'file_size': Path(svg_path).stat().st_size
+        'mean_opacity': np.mean(opacities) if count else float('nan'),
+        'median_opacity': np.median(opacities) if count else float('nan'),
+        'file_size': st.st_size
     }
 
     return stats
 
 
-def plot_comparison(stats_list, output_path):
+def plot_comparison(stats_list, output_path, dpi=100):
     """Create comparison visualization"""
-    fig, axes = plt.subplots(2, 2, figsize=(14, 10))
+    # Render straight to Agg, the pyplot state machine and GUI backends are never loaded
+    fig = Figure(figsize=(14, 10), layout='constrained')
+    FigureCanvasAgg(fig)
+    axes = fig.subplots(2, 2)
     fig.suptitle('Pruning Effectiveness Analysis', fontsize=16, fontweight='bold')
 
     # Subplot 1: Opacity distribution histograms
     ax = axes[0, 0]
+    edges = np.linspace(0.0, 1.0, 51)
     for stats in stats_list:
-        ax.hist(stats['opacities'], bins=50, alpha=0.6, label=stats['name'])
+        counts, _ = np.histogram(stats['opacities'], bins=edges)
+        ax.stairs(counts, edges, fill=True, alpha=0.6, label=stats['name'])
     ax.set_xlabel('Stroke Opacity', fontsize=11)
     ax.set_ylabel('Count', fontsize=11)
     ax.set_title('Opacity Distribution', fontsize=12, fontweight='bold')
@@ -140,9 +314,11 @@ def plot_comparison(stats_list, output_path):
     x = np.arange(len(categories))
     width = 0.8 / len(stats_list)
 
-    for i, stats in enumerate(stats_list):
-        counts = [stats['dead'], stats['ghost'], stats['low'], stats['visible']]
-        ax.bar(x + i * width, counts, width, label=stats['name'], alpha=0.8)
+    counts = np.array([[s['dead'], s['ghost'], s['low'], s['visible']] for s in stats_list])
+    offsets = x + np.arange(len(stats_list))[:, None] * width
+
+    for stats, xs, ys in zip(stats_list, offsets, counts):
+        ax.bar(xs, ys, width, label=stats['name'], alpha=0.8)
 
     ax.set_xlabel('Stroke Category', fontsize=11)
     ax.set_ylabel('Count', fontsize=11)
@@ -170,7 +346,7 @@ def plot_comparison(stats_list, output_path):
     ax.set_title('Final Stroke Count', fontsize=12, fontweight='bold')
     ax.grid(True, alpha=0.3, axis='y')
     # No rotation needed for short names
-    plt.setp(ax.xaxis.get_majorticklabels(), fontsize=10)
+    ax.tick_params(axis='x', labelsize=10)
 
     # Subplot 4: File size comparison
     ax = axes[1, 1]
@@ -187,34 +363,36 @@ def plot_comparison(stats_list, output_path):
     ax.set_title('SVG File Size', fontsize=12, fontweight='bold')
     ax.grid(True, alpha=0.3, axis='y')
     # No rotation needed for short names
-    plt.setp(ax.xaxis.get_majorticklabels(), fontsize=10)
+    ax.tick_params(axis='x', labelsize=10)
 
-    plt.tight_layout()
-    plt.savefig(output_path, dpi=150, bbox_inches='tight')
+    # Low PNG compression: the default zlib level dominates savefig time
+    fig.savefig(output_path, dpi=dpi, pil_kwargs={'compress_level': 1})
     print(f"✓ Visualization saved to: {output_path}")
 
 
 def print_report(stats_list):
     """Print detailed analysis report"""
-    print("\n" + "="*70)
-    print("DETAILED PRUNING ANALYSIS REPORT")
-    print("="*70 + "\n")
+    # Build the whole report and write it once
+    parts = ["", "="*70, "DETAILED PRUNING ANALYSIS REPORT", "="*70, ""]
 
     for i, stats in enumerate(stats_list, 1):
-        print(f"{i}. {stats['name']}")
-        print(f"   {'─' * 60}")
-        print(f"   Total Strokes:     {stats['total']}")
-        print(f"   Dead (α<0.01):     {stats['dead']:4d} ({stats['dead']/stats['total']*100:5.1f}%)")
-        print(f"   Ghost (0.01-0.1):  {stats['ghost']:4d} ({stats['ghost']/stats['total']*100:5.1f}%)")
-        print(f"   Low (0.1-0.3):     {stats['low']:4d} ({stats['low']/stats['total']*100:5.1f}%)")
-        print(f"   Visible (≥0.3):    {stats['visible']:4d} ({stats['visible']/stats['total']*100:5.1f}%)")
-        print(f"   Mean Opacity:      {stats['mean_opacity']:.3f}")
-        print(f"   Median Opacity:    {stats['median_opacity']:.3f}")
-        print(f"   File Size:         {stats['file_size']/1024:.2f} KB")
-        print()
+        total = stats['total'] or 1  # an SVG without strokes reports 0% instead of dividing by zero
+        parts += [
+            f"{i}. {stats['name']}",
+            f"   {'─' * 60}",
+            f"   Total Strokes:     {stats['total']}",
+            f"   Dead (α<0.01):     {stats['dead']:4d} ({stats['dead']/total*100:5.1f}%)",
+            f"   Ghost (0.01-0.1):  {stats['ghost']:4d} ({stats['ghost']/total*100:5.1f}%)",
+            f"   Low (0.1-0.3):     {stats['low']:4d} ({stats['low']/total*100:5.1f}%)",
+            f"   Visible (≥0.3):    {stats['visible']:4d} ({stats['visible']/total*100:5.1f}%)",
+            f"   Mean Opacity:      {stats['mean_opacity']:.3f}",
+            f"   Median Opacity:    {stats['median_opacity']:.3f}",
+            f"   File Size:         {stats['file_size']/1024:.2f} KB",
+            "",
+        ]
 
     # Calculate improvements
-    if len(stats_list) >= 2:
+    if len(stats_list) >= 2 and stats_list[0]['total'] and stats_list[0]['file_size']:
         baseline = stats_list[0]
         pruned = stats_list[1]
 
@@ -222,14 +400,32 @@ def print_report(stats_list):
         size_reduction = (baseline['file_size'] - pruned['file_size']) / baseline['file_size'] * 100
         dead_reduction = (baseline['dead'] - pruned['dead'])
 
-        print("="*70)
-        print("PRUNING EFFECTIVENESS METRICS")
-        print("="*70)
-        print(f"Stroke Reduction:    {stroke_reduction:6.1f}% ({baseline['total']} → {pruned['total']})")
-        print(f"Dead Strokes Removed: {dead_reduction:6d} strokes eliminated")
-        print(f"File Size Reduction:  {size_reduction:6.1f}% ({baseline['file_size']/1024:.1f}KB → {pruned['file_size']/1024:.1f}KB)")
-        print(f"Opacity Improvement:  {baseline['mean_opacity']:.3f} → {pruned['mean_opacity']:.3f}")
-        print("="*70 + "\n")
+        parts += [
+            "="*70,
+            "PRUNING EFFECTIVENESS METRICS",
+            "="*70,
+            f"Stroke Reduction:    {stroke_reduction:6.1f}% ({baseline['total']} → {pruned['total']})",
+            f"Dead Strokes Removed: {dead_reduction:6d} strokes eliminated",
+            f"File Size Reduction:  {size_reduction:6.1f}% ({baseline['file_size']/1024:.1f}KB → {pruned['file_size']/1024:.1f}KB)",
+            f"Opacity Improvement:  {baseline['mean_opacity']:.3f} → {pruned['mean_opacity']:.3f}",
+            "="*70,
+            "",
+        ]
+
+    sys.stdout.write("\n".join(parts) + "\n")
+
+
+CSV_FIELDS = ('name', 'path', 'total', 'dead', 'ghost', 'low', 'visible',
+              'mean_opacity', 'median_opacity', 'file_size')
+
+
+def write_csv(stats_list, csv_path):
+    """Write the per-file summary so downstream tools don't need to re-parse the SVGs"""
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_FIELDS)
+        writer.writerows([stats[k] for k in CSV_FIELDS] for stats in stats_list)
+    print(f"✓ Summary saved to: {csv_path}")
 
 
 def main():
@@ -238,15 +434,25 @@ def main():
     parser.add_argument('-o', '--output', default='pruning_analysis.png',
                         help='Output visualization file')
     parser.add_argument('--no-plot', action='store_true', help='Skip plotting')
+    parser.add_argument('--no-csv', action='store_true',
+                        help='Skip writing the summary CSV next to the visualization')
+    parser.add_argument('--dpi', type=int, default=100,
+                        help='Resolution of the visualization (use 150+ for print quality)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Re-parse every SVG instead of using the cache in '
+                             '$XDG_CACHE_HOME/diffsketcher_analyzer (default ~/.cache)')
 
     args = parser.parse_args()
 
-    # Analyze all files
-    stats_list = []
-    for svg_path in args.svg_files:
-        stats = analyze_svg_file(svg_path)  # Name auto-extracted in function
-        if stats:
-            stats_list.append(stats)
+    # Analyze all files, in parallel when there is more than one
+    analyze = functools.partial(analyze_svg_file, use_cache=not args.no_cache)
+    if len(args.svg_files) == 1:
+        results = map(analyze, args.svg_files)  # Name auto-extracted in function
+    else:
+        max_workers = min(len(args.svg_files), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(analyze, args.svg_files))
+    stats_list = [stats for stats in results if stats]
 
     if not stats_list:
         print("❌ No valid SVG files found!")
@@ -255,9 +461,12 @@ def main():
     # Print report
     print_report(stats_list)
 
+    if not args.no_csv:
+        write_csv(stats_list, Path(args.output).with_suffix('.csv'))
+
     # Generate visualization
     if not args.no_plot:
-        plot_comparison(stats_list, args.output)
+        plot_comparison(stats_list, args.output, dpi=args.dpi)
 
     return 0
 
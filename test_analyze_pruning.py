@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Regression checks for the raw-byte SVG scanner in analyze_pruning.py
+"""
+
+import numpy as np
+
+from analyze_pruning import scan_svg_bytes, parse_svg_xml
+
+SVG_HEAD = '<svg xmlns="http://www.w3.org/2000/svg">'
+
+
+def _write_svg(tmp_path, body):
+    svg_path = tmp_path / 'test.svg'
+    svg_path.write_text(SVG_HEAD + body + '</svg>')
+    return svg_path
+
+
+def test_gt_inside_attribute_value(tmp_path):
+    svg_path = _write_svg(tmp_path, '<path data-x="a>b" stroke-opacity="0.001"/>')
+
+    scanned = scan_svg_bytes(svg_path)
+    parsed = parse_svg_xml(svg_path)
+    assert scanned is not None
+    assert scanned[1] == parsed[1] == 1
+    np.testing.assert_allclose(scanned[0], parsed[0])
+    np.testing.assert_allclose(scanned[0], [0.001])
+
+
+def test_exponent_and_negative_style_opacity(tmp_path):
+    svg_path = _write_svg(tmp_path,
+                          '<path style="stroke-opacity:1e-05"/><path style="stroke-opacity:-0.5"/>')
+
+    scanned = scan_svg_bytes(svg_path)
+    parsed = parse_svg_xml(svg_path)
+    np.testing.assert_allclose(scanned[0], [1e-05, -0.5])
+    np.testing.assert_allclose(parsed[0], [1e-05, -0.5])
@@ -268,5 +268,6 @@ echo ""
 echo "Analysis outputs:"
 echo "   - ${TEST_DIR}/RESULTS.txt (text summary)"
 echo "   - ${TEST_DIR}/pruning_analysis.png (visual charts)"
+echo "   - ${TEST_DIR}/pruning_analysis.csv (per-file summary)"
 echo ""
 echo "======================================================"
\ No newline at end of file